@@ -2,13 +2,14 @@ from openai import OpenAI
 import os
 import json
 from rag import rag_system
+from limiter import model_limiter, BATCH
 
 client = OpenAI()
 
-def generate_dialogue_script():
+def generate_dialogue_script(priority=None):
     """Generates a text script for the dialogue."""
     # Use full context if available, otherwise summary
-    context = rag_system.full_lexical_context if rag_system.full_lexical_context else rag_system.get_summary()
+    context = rag_system.full_lexical_context if rag_system.full_lexical_context else rag_system.get_summary(priority)
     
     # Truncate for safety (stay well within 128k context of 4o-mini)
     # 50,000 chars is roughly 12k tokens, leaving plenty of room for output
@@ -34,12 +35,13 @@ def generate_dialogue_script():
     ]
     """
     
-    response = client.chat.completions.create(
-        model="gpt-4o-mini",
-        messages=[{"role": "system", "content": "You are an educational scriptwriter."},
-                  {"role": "user", "content": prompt}],
-        response_format={"type": "json_object"}
-    )
+    with model_limiter.limit(priority):
+        response = client.chat.completions.create(
+            model="gpt-4o-mini",
+            messages=[{"role": "system", "content": "You are an educational scriptwriter."},
+                      {"role": "user", "content": prompt}],
+            response_format={"type": "json_object"}
+        )
     
     content = response.choices[0].message.content
     # Ideally parsing json properly
@@ -54,14 +56,16 @@ def generate_dialogue_script():
     except:
         return []
 
-def generate_audio_files(script_data, output_dir="static/audio"):
-    """Generates audio files for each line."""
+def generate_audio_files(script_data, output_dir="static/audio", should_cancel=None):
+    """Generates audio files for each line. Stops early if should_cancel() returns True."""
     if not os.path.exists(output_dir):
         os.makedirs(output_dir)
         
     result = []
     
     for i, line in enumerate(script_data):
+        if should_cancel and should_cancel():
+            break
         speaker = line["speaker"]
         text = line["text"]
         # Use hash of text for filename to ensure audio matches text
@@ -75,12 +79,14 @@ def generate_audio_files(script_data, output_dir="static/audio"):
         
         if not os.path.exists(filepath): # Cache check
             try:
-                response = client.audio.speech.create(
-                    model="tts-1",
-                    voice=voice,
-                    input=text
-                )
-                response.stream_to_file(filepath)
+                # TTS is bulk work; interactive chat goes first
+                with model_limiter.limit(BATCH):
+                    response = client.audio.speech.create(
+                        model="tts-1",
+                        voice=voice,
+                        input=text
+                    )
+                    response.stream_to_file(filepath)
             except Exception as e:
                 print(f"Error generating audio for {i}: {e}")
         
@@ -0,0 +1,215 @@
+import contextvars
+import heapq
+import itertools
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+# Priority classes for outbound model calls (lower value is served first)
+INTERACTIVE = 0  # Chat answers, on-demand summary/dialogue script
+BATCH = 1        # Ingestion embeddings, TTS, warm-up
+
+PRIORITY_NAMES = {INTERACTIVE: "interactive", BATCH: "batch"}
+
+# How often a waiter with a callable priority re-checks it for an escalation
+PRIORITY_POLL_INTERVAL = 0.05
+
+# Priority for calls made deep inside LangChain (retriever embeddings, chain LLMs),
+# where it cannot be passed as an argument. LangChain copies context into its worker threads.
+_current_priority = contextvars.ContextVar("model_call_priority", default=INTERACTIVE)
+
+
+@contextmanager
+def priority_scope(priority):
+    """
+    Model calls made inside this block default to the given priority: a class,
+    or a callable returning one (re-read while waiting). None keeps the current one.
+    """
+    if priority is None:
+        yield
+        return
+    token = _current_priority.set(priority)
+    try:
+        yield
+    finally:
+        _current_priority.reset(token)
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent identical calls: the first caller for a key runs the
+    function, callers arriving while it is in flight wait and share its result
+    (or its exception).
+
+    If the first caller passes a priority, the function's model calls run at the
+    most urgent priority of all callers, including ones that join later.
+    """
+
+    class _Call:
+        def __init__(self):
+            self.event = threading.Event()
+            self.result = None
+            self.error = None
+            self.priority = None
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+        self._stats = {"executed": 0, "coalesced": 0}
+
+    def do(self, key, fn, *args, priority=None, **kwargs):
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._Call()
+                self._calls[key] = call
+                self._stats["executed"] += 1
+            else:
+                self._stats["coalesced"] += 1
+            if priority is not None and (call.priority is None or priority < call.priority):
+                call.priority = priority
+
+        if not leader:
+            call.event.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            with priority_scope(None if priority is None else (lambda: call.priority)):
+                call.result = fn(*args, **kwargs)
+            return call.result
+        except BaseException as e:
+            # Also KeyboardInterrupt/GeneratorExit: joiners must raise, not return None
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.event.set()
+
+    def metrics(self):
+        with self._lock:
+            return {**self._stats, "in_flight": len(self._calls)}
+
+
+class PriorityRateLimiter:
+    """
+    Process-wide token bucket plus concurrency cap. Waiters are served strictly
+    by (priority, arrival order), so interactive calls overtake queued batch work.
+    """
+
+    def __init__(self, rate, burst, max_concurrency, clock=time.monotonic):
+        # Fail fast: a zero rate divides by zero in acquire, zero concurrency hangs every call
+        if rate <= 0:
+            raise ValueError(f"Rate limit must be positive (MODEL_RATE_LIMIT), got {rate}")
+        if burst < 1:
+            raise ValueError(f"Burst must be at least 1 (MODEL_RATE_BURST), got {burst}")
+        if max_concurrency < 1:
+            raise ValueError(f"Max concurrency must be at least 1 (MODEL_MAX_CONCURRENCY), got {max_concurrency}")
+        self.rate = float(rate)
+        self.burst = float(burst)
+        self.max_concurrency = max_concurrency
+        self._clock = clock
+        self._cond = threading.Condition()
+        self._tokens = self.burst
+        self._last_refill = clock()
+        self._waiters = []  # Heap of (priority, seq)
+        self._seq = itertools.count()
+        self._in_flight = 0
+        self._stats = {
+            p: {"acquired": 0, "total_wait": 0.0, "max_wait": 0.0}
+            for p in PRIORITY_NAMES
+        }
+
+    def _refill(self):
+        now = self._clock()
+        self._tokens = min(self.burst, self._tokens + (now - self._last_refill) * self.rate)
+        self._last_refill = now
+
+    def acquire(self, priority=None):
+        """Blocks until a token and a concurrency slot are available for this caller."""
+        source = _current_priority.get() if priority is None else priority
+        # A callable priority may be raised while waiting (a coalesced call gaining an interactive caller)
+        dynamic = callable(source)
+        start = self._clock()
+        with self._cond:
+            entry = (source() if dynamic else source, next(self._seq))
+            heapq.heappush(self._waiters, entry)
+            while True:
+                if dynamic and source() < entry[0]:
+                    # Re-queue at the higher priority, keeping the original arrival order
+                    self._waiters.remove(entry)
+                    heapq.heapify(self._waiters)
+                    entry = (source(), entry[1])
+                    heapq.heappush(self._waiters, entry)
+                self._refill()
+                if self._waiters[0] == entry and self._tokens >= 1 and self._in_flight < self.max_concurrency:
+                    break
+                timeout = None
+                if self._waiters[0] == entry and self._tokens < 1:
+                    # Sleep until the next token is due
+                    timeout = (1 - self._tokens) / self.rate
+                if dynamic:
+                    timeout = min(timeout, PRIORITY_POLL_INTERVAL) if timeout is not None else PRIORITY_POLL_INTERVAL
+                self._cond.wait(timeout)
+
+            heapq.heappop(self._waiters)
+            priority = entry[0]
+            self._tokens -= 1
+            self._in_flight += 1
+
+            waited = self._clock() - start
+            stats = self._stats[priority]
+            stats["acquired"] += 1
+            stats["total_wait"] += waited
+            stats["max_wait"] = max(stats["max_wait"], waited)
+
+            # Let the next waiter re-check now that it may be at the head
+            self._cond.notify_all()
+
+    def release(self):
+        with self._cond:
+            self._in_flight -= 1
+            self._cond.notify_all()
+
+    @contextmanager
+    def limit(self, priority=None):
+        """Holds a slot for the duration of the block (including streamed responses)."""
+        self.acquire(priority)
+        try:
+            yield
+        finally:
+            self.release()
+
+    def metrics(self):
+        with self._cond:
+            self._refill()
+            queue_depth = {name: 0 for name in PRIORITY_NAMES.values()}
+            for priority, _ in self._waiters:
+                queue_depth[PRIORITY_NAMES[priority]] += 1
+            wait_times = {}
+            for priority, stats in self._stats.items():
+                acquired = stats["acquired"]
+                wait_times[PRIORITY_NAMES[priority]] = {
+                    "acquired": acquired,
+                    "avg_wait_ms": round(stats["total_wait"] * 1000 / acquired, 1) if acquired else 0.0,
+                    "max_wait_ms": round(stats["max_wait"] * 1000, 1),
+                }
+            return {
+                "queue_depth": queue_depth,
+                "in_flight": self._in_flight,
+                "tokens_available": round(self._tokens, 2),
+                "wait_times": wait_times,
+            }
+
+
+# Singletons shared by all outbound OpenAI calls in this process
+model_limiter = PriorityRateLimiter(
+    rate=float(os.environ.get("MODEL_RATE_LIMIT", "5")),         # Requests per second
+    burst=float(os.environ.get("MODEL_RATE_BURST", "10")),
+    max_concurrency=int(os.environ.get("MODEL_MAX_CONCURRENCY", "8")),
+)
+request_coalescer = SingleFlight()
@@ -0,0 +1,267 @@
+"""
+Load test for request coalescing and the model limiter against a local fake API.
+
+Points the app's OpenAI clients at a fake provider (OPENAI_BASE_URL), ingests a
+small generated PDF, then simulates a class opening the app together through
+the real Flask routes: many identical /api/summary and /api/dialogue requests,
+with chat requests arriving while the dialogue's TTS backlog drains. The fake
+provider rejects requests above its concurrency limit with 429.
+
+Usage: python load_test.py
+"""
+import hashlib
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+FAKE_LATENCY = 0.3        # Seconds per fake model call
+PROVIDER_MAX_CONCURRENCY = 2
+DIALOGUE_LINES = 12
+
+SUMMARY_CLIENTS = 30
+DIALOGUE_CLIENTS = 30
+CHAT_CLIENTS = 4
+
+
+class FakeProvider:
+    """Counts calls per kind and concurrency; returns 429 above PROVIDER_MAX_CONCURRENCY."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.calls = {}
+        self.rejected = 0
+
+    def count(self, kind):
+        with self.lock:
+            return self.calls.get(kind, 0)
+
+
+def classify(path, body):
+    if path.endswith("/embeddings"):
+        return "embeddings"
+    if path.endswith("/audio/speech"):
+        return "speech"
+    if body.get("stream"):
+        return "chat"
+    if body.get("response_format"):
+        return "dialogue_script"
+    return "summary"
+
+
+def fake_embedding(value):
+    digest = hashlib.md5(json.dumps(value).encode("utf-8")).digest()
+    return [b / 255 for b in digest[:8]]
+
+
+def make_handler(provider):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_POST(self):
+            body = json.loads(self.rfile.read(int(self.headers["Content-Length"])) or b"{}")
+            kind = classify(self.path, body)
+            with provider.lock:
+                provider.calls[kind] = provider.calls.get(kind, 0) + 1
+                provider.in_flight += 1
+                provider.max_in_flight = max(provider.max_in_flight, provider.in_flight)
+                over_limit = provider.in_flight > PROVIDER_MAX_CONCURRENCY
+                if over_limit:
+                    provider.rejected += 1
+            if not over_limit:
+                time.sleep(FAKE_LATENCY)
+            # Leave the in-flight count before the client sees the response
+            with provider.lock:
+                provider.in_flight -= 1
+
+            if over_limit:
+                self.send_json({"error": {"message": "Rate limit exceeded"}}, status=429)
+            elif kind == "embeddings":
+                inputs = body["input"] if isinstance(body["input"], list) else [body["input"]]
+                self.send_json({
+                    "object": "list",
+                    "model": body.get("model"),
+                    "data": [{"object": "embedding", "index": i, "embedding": fake_embedding(x)}
+                             for i, x in enumerate(inputs)],
+                    "usage": {"prompt_tokens": 0, "total_tokens": 0},
+                })
+            elif kind == "speech":
+                self.send_bytes(b"ID3fake-mp3", "audio/mpeg")
+            elif kind == "chat":
+                self.send_stream(["Fake ", "streamed ", "answer."])
+            elif kind == "dialogue_script":
+                lines = [{"speaker": "Teacher" if i % 2 else "Student", "text": f"Line {i} of the dialogue."}
+                         for i in range(DIALOGUE_LINES)]
+                self.send_completion(json.dumps({"dialogue": lines}))
+            else:
+                self.send_completion("Fake summary of the material.")
+
+        def send_json(self, payload, status=200):
+            self.send_bytes(json.dumps(payload).encode("utf-8"), "application/json", status)
+
+        def send_bytes(self, data, content_type, status=200):
+            self.send_response(status)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def send_completion(self, content):
+            self.send_json({
+                "id": "chatcmpl-fake", "object": "chat.completion", "created": 0, "model": "gpt-4o-mini",
+                "choices": [{"index": 0, "finish_reason": "stop",
+                             "message": {"role": "assistant", "content": content}}],
+                "usage": {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0},
+            })
+
+        def send_stream(self, parts):
+            events = []
+            for part in parts + [None]:
+                chunk = {
+                    "id": "chatcmpl-fake", "object": "chat.completion.chunk", "created": 0, "model": "gpt-4o-mini",
+                    "choices": [{"index": 0, "delta": {"content": part} if part else {},
+                                 "finish_reason": None if part else "stop"}],
+                }
+                events.append(f"data: {json.dumps(chunk)}\n\n")
+            events.append("data: [DONE]\n\n")
+            self.send_bytes("".join(events).encode("utf-8"), "text/event-stream")
+
+        def log_message(self, *args):
+            pass
+
+    return Handler
+
+
+def make_pdf(path):
+    import fitz
+    doc = fitz.open()
+    for i in range(3):
+        page = doc.new_page()
+        page.insert_text((72, 72), f"Page {i}: photosynthesis converts light energy into chemical energy " * 3)
+    doc.save(path)
+    doc.close()
+
+
+def run_concurrently(count, fn, finished_at=None):
+    results = [None] * count
+
+    def worker(i):
+        results[i] = fn()
+        if finished_at is not None:
+            finished_at.append(time.monotonic())
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(count)]
+    for t in threads:
+        t.start()
+    return threads, results
+
+
+def main():
+    provider = FakeProvider()
+    server = ThreadingHTTPServer(("127.0.0.1", 0), make_handler(provider))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    # Must be set before the app creates its OpenAI clients
+    os.environ["OPENAI_BASE_URL"] = f"http://127.0.0.1:{server.server_address[1]}/v1"
+    os.environ["OPENAI_API_KEY"] = "sk-fake"
+    os.environ["MODEL_MAX_CONCURRENCY"] = str(PROVIDER_MAX_CONCURRENCY)
+    os.environ["MODEL_RATE_LIMIT"] = "20"
+    os.environ["MODEL_RATE_BURST"] = "5"
+    os.environ["WARMUP_ENABLED"] = "false"
+
+    workdir = tempfile.mkdtemp(prefix="studysync-load-")
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    os.chdir(workdir)  # Generated audio goes to ./static/audio
+
+    import main as app_module
+    from rag import rag_system
+
+    # Keeps the test offline: skips tiktoken's encoding download for length checks
+    rag_system.embeddings.embeddings.check_embedding_ctx_length = False
+
+    pdf_path = os.path.join(workdir, "chapter.pdf")
+    make_pdf(pdf_path)
+    app_module.run_ingestion_thread([pdf_path], [], app_module.cancel_warmup())
+    assert app_module.processing_state["status"] == "complete", app_module.processing_state
+
+    client = app_module.app.test_client()
+    statuses = []
+    statuses_lock = threading.Lock()
+
+    def get(path):
+        resp = client.get(path)
+        with statuses_lock:
+            statuses.append(resp.status_code)
+        return resp.get_json()
+
+    def chat():
+        resp = client.post("/api/chat", json={"question": "What is photosynthesis?"})
+        data = resp.get_data(as_text=True)
+        with statuses_lock:
+            statuses.append(resp.status_code)
+        return data
+
+    dialogue_done = []
+    chat_done = []
+    started = time.monotonic()
+    summary_threads, summaries = run_concurrently(SUMMARY_CLIENTS, lambda: get("/api/summary"))
+    dialogue_threads, dialogues = run_concurrently(DIALOGUE_CLIENTS, lambda: get("/api/dialogue"), dialogue_done)
+    # Chat arrives while the dialogue's TTS backlog is draining
+    time.sleep(FAKE_LATENCY * 3)
+    chat_threads, chats = run_concurrently(CHAT_CLIENTS, chat, chat_done)
+    for t in summary_threads + dialogue_threads + chat_threads:
+        t.join()
+    elapsed = time.monotonic() - started
+
+    # Later requests are served from the cache without new provider calls
+    get("/api/summary")
+    get("/api/dialogue")
+    metrics = client.get("/api/metrics").get_json()
+    server.shutdown()
+
+    report = {
+        "elapsed_s": round(elapsed, 2),
+        "provider_calls": provider.calls,
+        "provider_max_in_flight": provider.max_in_flight,
+        "provider_rejected_429": provider.rejected,
+        "metrics": metrics,
+    }
+    print(json.dumps(report, indent=2))
+
+    failures = []
+    if provider.count("summary") != 1:
+        failures.append("identical /api/summary requests were not coalesced into one LLM call")
+    if provider.count("dialogue_script") != 1:
+        failures.append("identical /api/dialogue requests were not coalesced into one script call")
+    if provider.count("speech") != DIALOGUE_LINES:
+        failures.append("dialogue audio was synthesized more than once per line")
+    if provider.count("chat") != CHAT_CLIENTS:
+        failures.append("chat requests did not each reach the provider")
+    if provider.rejected:
+        failures.append("provider rejected requests (limiter let too many through)")
+    if any(status != 200 for status in statuses):
+        failures.append(f"some requests failed: {sorted(set(statuses))}")
+    if any(s["summary"] != summaries[0]["summary"] for s in summaries):
+        failures.append("coalesced /api/summary requests got different results")
+    if any(len(d["dialogue"]) != DIALOGUE_LINES for d in dialogues):
+        failures.append("coalesced /api/dialogue requests got incomplete dialogues")
+    if any("Fake streamed answer." not in c for c in chats):
+        failures.append("chat responses were not streamed through")
+    # Strict priority ordering is covered by test_limiter.py; here chat must not wait out the TTS backlog
+    if max(chat_done) >= min(dialogue_done):
+        failures.append("chat requests waited behind the dialogue's TTS backlog")
+
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    if failures:
+        sys.exit(1)
+    print("OK: routes coalesced, concurrency cap held and chat stayed ahead of TTS under load.")
+
+
+if __name__ == "__main__":
+    main()
@@ -19,7 +19,8 @@ def health_check():
     return jsonify({"status": "healthy", "service": "Citrine & Sage Integration Backend"})
 
 from rag import rag_system
-from audio_gen import generate_dialogue_script, generate_audio_files
+from warmup import get_shared_summary, get_shared_dialogue, get_cached_answer, cancel_warmup, publish_sources, start_warmup, warmup_state
+from limiter import model_limiter, request_coalescer
 
 @app.route('/api/chat', methods=['POST'])
 def chat():
@@ -31,7 +32,26 @@ def chat():
     from flask import Response, stream_with_context
     import json
 
+    def format_sources(docs):
+        # Send sources as a special delimiter line at the end
+        sources = []
+        for doc in docs:
+            sources.append({
+                "content": doc.page_content[:200] + "...", 
+                "metadata": doc.metadata
+            })
+        return "\n__SOURCES__:" + json.dumps(sources)
+
     def generate():
+        # Starter questions answered by the warm-up stage are served from cache
+        cached = get_cached_answer(question)
+        if cached:
+            answer, docs = cached
+            yield answer
+            if docs:
+                yield format_sources(docs)
+            return
+
         # Yield result
         # Note: If stream_answer_with_docs fails, we should handle it
         try:
@@ -39,14 +59,7 @@ def chat():
                 if text_chunk:
                     yield text_chunk
                 if docs:
-                    # Send sources as a special delimiter line at the end
-                    sources = []
-                    for doc in docs:
-                        sources.append({
-                            "content": doc.page_content[:200] + "...", 
-                            "metadata": doc.metadata
-                        })
-                    yield "\n__SOURCES__:" + json.dumps(sources)
+                    yield format_sources(docs)
         except Exception as e:
             yield f"Error: {str(e)}"
 
@@ -54,18 +67,15 @@ def chat():
 
 @app.route('/api/summary', methods=['GET'])
 def get_summary_route():
-    summary = rag_system.get_summary()
+    # Served from the warm-up cache, or joins the in-flight call for the current sources
+    summary = get_shared_summary()
     return jsonify({"summary": summary})
 
 @app.route('/api/dialogue', methods=['GET'])
 def get_dialogue():
-    # In a real app, we might cache this or generate on demand.
-    # For MVP, let's generate if empty, or return cached.
-    # We'll just generate every time for simplicity or check simpler cache
-    
+    # Cached per ingestion; concurrent requests (and the warm-up) share one generation run
     try:
-        script = generate_dialogue_script()
-        audio_data = generate_audio_files(script)
+        audio_data = get_shared_dialogue()
         return jsonify({"dialogue": audio_data})
     except Exception as e:
         return jsonify({"error": str(e)}), 500
@@ -106,13 +116,13 @@ def update_progress(msg):
     processing_state["message"] = msg
     processing_state["status"] = "processing"
 
-def run_ingestion_thread(pdf_files, youtube_urls):
+def run_ingestion_thread(pdf_files, youtube_urls, generation):
     global processing_state
     try:
         processing_state["status"] = "processing"
         processing_state["message"] = "Starting ingestion..."
         
-        rag_system.initialize_vector_store(
+        indexed = rag_system.initialize_vector_store(
             pdf_paths=pdf_files, 
             video_urls=youtube_urls, 
             progress_callback=update_progress
@@ -120,6 +130,12 @@ def run_ingestion_thread(pdf_files, youtube_urls):
         
         processing_state["status"] = "complete"
         processing_state["message"] = "Knowledge base updated!"
+
+        # New sources are live only now: drop results cached from the old ones, then
+        # optionally warm up. Skipped when nothing was indexed: the old content is still loaded.
+        if indexed:
+            publish_sources()
+            start_warmup(generation)
     except Exception as e:
         print(f"Ingestion failed: {e}")
         processing_state["status"] = "error"
@@ -127,7 +143,14 @@ def run_ingestion_thread(pdf_files, youtube_urls):
 
 @app.route('/api/status', methods=['GET'])
 def get_status():
-    return jsonify(processing_state)
+    return jsonify({**processing_state, "warmup": warmup_state})
+
+@app.route('/api/metrics', methods=['GET'])
+def get_metrics():
+    return jsonify({
+        "model_limiter": model_limiter.metrics(),
+        "coalescing": request_coalescer.metrics()
+    })
 
 @app.route('/api/process-sources', methods=['POST'])
 def process_sources():
@@ -168,8 +191,11 @@ def process_sources():
         "percent": 0
     }
     
+    # A newer ingestion cancels any running warm-up (cached results stay until the new index is live)
+    generation = cancel_warmup()
+    
     # Start Thread
-    thread = threading.Thread(target=run_ingestion_thread, args=(pdf_files, youtube_urls))
+    thread = threading.Thread(target=run_ingestion_thread, args=(pdf_files, youtube_urls, generation))
     thread.daemon = True # Kill if main kills
     thread.start()
     
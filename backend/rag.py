@@ -4,19 +4,39 @@ from langchain_text_splitters import RecursiveCharacterTextSplitter
 from langchain_core.prompts import ChatPromptTemplate
 from langchain_core.output_parsers import StrOutputParser
 from langchain_core.runnables import RunnablePassthrough
+from langchain_core.embeddings import Embeddings
 from ingest import load_data
+from limiter import model_limiter, priority_scope, BATCH
 import os
 
+class RateLimitedEmbeddings(Embeddings):
+    """Routes embedding calls through the global limiter: ingestion batches as BATCH, queries at the caller's priority."""
+
+    def __init__(self, embeddings, batch_size=500):
+        self.embeddings = embeddings
+        self.batch_size = batch_size
+
+    def embed_documents(self, texts):
+        vectors = []
+        for start in range(0, len(texts), self.batch_size):
+            with model_limiter.limit(BATCH):
+                vectors.extend(self.embeddings.embed_documents(texts[start:start + self.batch_size]))
+        return vectors
+
+    def embed_query(self, text):
+        with model_limiter.limit():
+            return self.embeddings.embed_query(text)
+
 class RAGSystem:
     def __init__(self):
-        self.embeddings = OpenAIEmbeddings()
+        self.embeddings = RateLimitedEmbeddings(OpenAIEmbeddings())
         self.vector_store = None
         self.qa_chain = None
         self.full_lexical_context = ""
         # self.initialize_vector_store() # Removed to prevent blocking startup
 
     def initialize_vector_store(self, pdf_paths=None, video_urls=None, progress_callback=None):
-        """Initializes or rebuilds the vector store from provided sources."""
+        """Initializes or rebuilds the vector store from provided sources. Returns True if anything was indexed."""
         print("Initializing RAG System... (PDFs: {}, Videos: {})".format(pdf_paths, video_urls))
         if progress_callback:
             progress_callback("Initializing content ingestion...")
@@ -27,7 +47,7 @@ class RAGSystem:
             print("No data found to index.")
             if progress_callback:
                 progress_callback("No data found to index.")
-            return
+            return False
 
         text_splitter = RecursiveCharacterTextSplitter(
             chunk_size=1000,
@@ -76,32 +96,41 @@ class RAGSystem:
             def format_docs(docs):
                 return "\n\n".join(doc.page_content for doc in docs)
             
+            def limited_llm(prompt_value):
+                # Priority comes from the caller's priority_scope (see query)
+                with model_limiter.limit():
+                    return llm.invoke(prompt_value)
+            
             from langchain_core.runnables import RunnableParallel
 
             self.qa_chain = (
                 RunnableParallel({"context": retriever | format_docs, "docs": retriever, "question": RunnablePassthrough()})
-                .assign(answer=prompt | llm | StrOutputParser())
+                .assign(answer=prompt | limited_llm | StrOutputParser())
                 .pick(["answer", "docs"])
             )
             
             print(f"RAG System Ready with {len(all_splits)} chunks.")
+            return True
         else:
             print("No text chunks created.")
+            return False
 
-    def query(self, question):
+    def query(self, question, priority=None):
         if not self.qa_chain:
             return {"answer": "System is not initialized or has no data.", "docs": []}
         
-        return self.qa_chain.invoke(question)
+        with priority_scope(priority):
+            return self.qa_chain.invoke(question)
 
-    def stream_answer_with_docs(self, question):
+    def stream_answer_with_docs(self, question, priority=None):
         """Yields (chunk, None) for text, then (None, docs) at the end."""
         if not self.qa_chain:
             yield "System not initialized", None
             return
 
         retriever = self.vector_store.as_retriever(search_kwargs={"k": 6})
-        docs = retriever.invoke(question)
+        with priority_scope(priority):
+            docs = retriever.invoke(question)
         
         context_str = "\n\n".join(doc.page_content for doc in docs)
         
@@ -113,13 +142,15 @@ class RAGSystem:
         final_prompt = template.format(context=context_str, question=question)
         llm = ChatOpenAI(model_name="gpt-4o-mini", temperature=0, streaming=True)
         
-        for chunk in llm.stream(final_prompt):
-             if chunk.content:
-                 yield chunk.content, None
+        # Hold the limiter slot for the whole stream
+        with model_limiter.limit(priority):
+            for chunk in llm.stream(final_prompt):
+                 if chunk.content:
+                     yield chunk.content, None
                  
         yield None, docs
 
-    def get_summary(self):
+    def get_summary(self, priority=None):
         """Generates a summary of all content."""
         if not self.full_lexical_context and not self.vector_store:
             return "No content to summarize."
@@ -135,11 +166,12 @@ class RAGSystem:
             llm = ChatOpenAI(model_name="gpt-4o-mini", temperature=0)
             chain = prompt | llm | StrOutputParser()
             try:
-                return chain.invoke({"context": self.full_lexical_context[:50000]}) # Safe limit
+                with model_limiter.limit(priority):
+                    return chain.invoke({"context": self.full_lexical_context[:50000]}) # Safe limit
             except:
-                return self.query("Summarize main concepts")["answer"]
+                return self.query("Summarize main concepts", priority)["answer"]
         
-        return self.query("Provide a detailed summary of the main concepts discussed in the provided text and videos.")["answer"]
+        return self.query("Provide a detailed summary of the main concepts discussed in the provided text and videos.", priority)["answer"]
 
 # Singleton instance for easy import
 rag_system = RAGSystem()
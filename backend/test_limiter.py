@@ -0,0 +1,255 @@
+import threading
+import time
+
+import pytest
+
+from limiter import PriorityRateLimiter, SingleFlight, priority_scope, INTERACTIVE, BATCH
+
+
+def wait_until(condition, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            raise AssertionError("condition not reached in time")
+        time.sleep(0.005)
+
+
+def run_joined(flight, key, fn, count):
+    """Starts count callers of flight.do(key, fn); returns (threads, outcomes)."""
+    outcomes = []
+    lock = threading.Lock()
+
+    def caller():
+        try:
+            result = flight.do(key, fn)
+        except Exception as e:
+            result = e
+        with lock:
+            outcomes.append(result)
+
+    threads = [threading.Thread(target=caller) for _ in range(count)]
+    for t in threads:
+        t.start()
+    wait_until(lambda: flight.metrics()["coalesced"] == count - 1)
+    return threads, outcomes
+
+
+def test_single_flight_shares_result():
+    flight = SingleFlight()
+    release = threading.Event()
+    calls = []
+
+    def compute():
+        calls.append(1)
+        release.wait()
+        return {"summary": "shared"}
+
+    threads, outcomes = run_joined(flight, "summary", compute, 8)
+    release.set()
+    for t in threads:
+        t.join()
+
+    assert len(calls) == 1
+    assert len(outcomes) == 8
+    assert all(outcome is outcomes[0] for outcome in outcomes)
+    assert flight.metrics() == {"executed": 1, "coalesced": 7, "in_flight": 0}
+
+
+def test_single_flight_shares_exception():
+    flight = SingleFlight()
+    release = threading.Event()
+    error = RuntimeError("provider down")
+
+    def compute():
+        release.wait()
+        raise error
+
+    threads, outcomes = run_joined(flight, "dialogue", compute, 5)
+    release.set()
+    for t in threads:
+        t.join()
+
+    assert len(outcomes) == 5
+    assert all(outcome is error for outcome in outcomes)
+
+
+def test_single_flight_shares_base_exception():
+    flight = SingleFlight()
+    release = threading.Event()
+
+    def compute():
+        release.wait()
+        raise KeyboardInterrupt()
+
+    outcomes = []
+    lock = threading.Lock()
+
+    def caller():
+        try:
+            result = flight.do("summary", compute)
+        except BaseException as e:
+            result = e
+        with lock:
+            outcomes.append(result)
+
+    threads = [threading.Thread(target=caller) for _ in range(3)]
+    for t in threads:
+        t.start()
+    wait_until(lambda: flight.metrics()["coalesced"] == 2)
+    release.set()
+    for t in threads:
+        t.join()
+
+    assert len(outcomes) == 3
+    assert all(isinstance(outcome, KeyboardInterrupt) for outcome in outcomes)
+
+
+def test_single_flight_runs_again_after_completion():
+    flight = SingleFlight()
+    calls = []
+    flight.do("summary", lambda: calls.append(1))
+    flight.do("summary", lambda: calls.append(1))
+    assert len(calls) == 2
+
+
+def test_limiter_serves_interactive_before_queued_batch():
+    limiter = PriorityRateLimiter(rate=1000, burst=100, max_concurrency=1)
+    limiter.acquire(BATCH)  # Holds the only slot
+    order = []
+
+    def waiter(priority, name):
+        with limiter.limit(priority):
+            order.append(name)
+
+    batch = threading.Thread(target=waiter, args=(BATCH, "batch"))
+    batch.start()
+    wait_until(lambda: limiter.metrics()["queue_depth"]["batch"] == 1)
+    interactive = threading.Thread(target=waiter, args=(INTERACTIVE, "interactive"))
+    interactive.start()
+    wait_until(lambda: limiter.metrics()["queue_depth"]["interactive"] == 1)
+
+    limiter.release()
+    batch.join()
+    interactive.join()
+
+    assert order == ["interactive", "batch"]
+
+
+def test_limiter_requeues_waiter_whose_priority_is_raised():
+    limiter = PriorityRateLimiter(rate=1000, burst=100, max_concurrency=1)
+    limiter.acquire(BATCH)  # Holds the only slot
+    order = []
+    escalated = {"priority": BATCH}
+
+    def waiter(priority, name):
+        with limiter.limit(priority):
+            order.append(name)
+
+    batch = threading.Thread(target=waiter, args=(BATCH, "batch"))
+    batch.start()
+    wait_until(lambda: limiter.metrics()["queue_depth"]["batch"] == 1)
+    dynamic = threading.Thread(target=waiter, args=(lambda: escalated["priority"], "escalated"))
+    dynamic.start()
+    wait_until(lambda: limiter.metrics()["queue_depth"]["batch"] == 2)
+
+    escalated["priority"] = INTERACTIVE
+    wait_until(lambda: limiter.metrics()["queue_depth"]["interactive"] == 1)
+    limiter.release()
+    batch.join()
+    dynamic.join()
+
+    assert order == ["escalated", "batch"]
+
+
+def test_single_flight_raises_priority_when_interactive_caller_joins():
+    limiter = PriorityRateLimiter(rate=1000, burst=100, max_concurrency=1)
+    flight = SingleFlight()
+    limiter.acquire(BATCH)  # Holds the only slot
+    order = []
+
+    def queued_batch():
+        with limiter.limit(BATCH):
+            order.append("batch")
+
+    def summary():
+        with limiter.limit():  # Priority from the coalesced call
+            order.append("summary")
+        return "summary"
+
+    batch = threading.Thread(target=queued_batch)
+    batch.start()
+    wait_until(lambda: limiter.metrics()["queue_depth"]["batch"] == 1)
+    # A warm-up starts the summary at batch priority, behind the queued batch call
+    leader = threading.Thread(target=flight.do, args=("summary", summary), kwargs={"priority": BATCH})
+    leader.start()
+    wait_until(lambda: limiter.metrics()["queue_depth"]["batch"] == 2)
+    # A user request joins it
+    results = []
+    joiner = threading.Thread(target=lambda: results.append(flight.do("summary", summary, priority=INTERACTIVE)))
+    joiner.start()
+    wait_until(lambda: limiter.metrics()["queue_depth"]["interactive"] == 1)
+
+    limiter.release()
+    for t in (batch, leader, joiner):
+        t.join()
+
+    assert order == ["summary", "batch"]
+    assert results == ["summary"]
+
+
+def test_limiter_caps_concurrency():
+    limiter = PriorityRateLimiter(rate=1000, burst=100, max_concurrency=2)
+    lock = threading.Lock()
+    state = {"active": 0, "peak": 0}
+
+    def worker():
+        with limiter.limit(BATCH):
+            with lock:
+                state["active"] += 1
+                state["peak"] = max(state["peak"], state["active"])
+            time.sleep(0.02)
+            with lock:
+                state["active"] -= 1
+
+    threads = [threading.Thread(target=worker) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert state["peak"] == 2
+    assert limiter.metrics()["wait_times"]["batch"]["acquired"] == 8
+
+
+def test_limiter_refills_tokens_at_rate():
+    limiter = PriorityRateLimiter(rate=20, burst=1, max_concurrency=5)
+    started = time.monotonic()
+    for _ in range(3):
+        with limiter.limit():
+            pass
+    # First token is in the bucket, the next two take 1/20 s each
+    assert time.monotonic() - started >= 0.09
+
+
+def test_priority_scope_sets_default_priority():
+    limiter = PriorityRateLimiter(rate=1000, burst=100, max_concurrency=1)
+    with priority_scope(BATCH):
+        with limiter.limit():
+            pass
+    with limiter.limit():
+        pass
+
+    waits = limiter.metrics()["wait_times"]
+    assert waits["batch"]["acquired"] == 1
+    assert waits["interactive"]["acquired"] == 1
+
+
+@pytest.mark.parametrize("rate, burst, max_concurrency", [
+    (0, 10, 8),
+    (-1, 10, 8),
+    (5, 0, 8),
+    (5, 10, 0),
+])
+def test_limiter_rejects_invalid_settings(rate, burst, max_concurrency):
+    with pytest.raises(ValueError):
+        PriorityRateLimiter(rate=rate, burst=burst, max_concurrency=max_concurrency)
@@ -0,0 +1,76 @@
+import os
+import threading
+
+import pytest
+
+# The OpenAI clients are created at import time; no request reaches the network here
+os.environ.setdefault("OPENAI_API_KEY", "sk-test")
+
+import main
+import warmup
+from limiter import BATCH
+from rag import rag_system
+
+
+@pytest.fixture
+def sources(monkeypatch):
+    """Stubs the knowledge base: get_summary summarizes whatever text is live."""
+    content = {"text": "OLD"}
+    monkeypatch.setattr(rag_system, "get_summary", lambda priority=None: f"summary of {content['text']}")
+    warmup.publish_sources()  # Start from an empty cache
+    return content
+
+
+def test_summary_requested_during_ingestion_is_not_served_after_it(sources, monkeypatch):
+    client = main.app.test_client()
+    during_ingestion = []
+
+    def initialize_vector_store(pdf_paths=None, video_urls=None, progress_callback=None):
+        # The old sources are still live while the new ones are being indexed
+        during_ingestion.append(client.get("/api/summary").get_json()["summary"])
+        sources["text"] = "NEW"
+        return True
+
+    monkeypatch.setattr(rag_system, "initialize_vector_store", initialize_vector_store)
+    # The warm-up's first step, run inline
+    monkeypatch.setattr(main, "start_warmup", lambda generation: warmup.get_shared_summary(BATCH))
+
+    main.run_ingestion_thread([], [], main.cancel_warmup())
+
+    assert during_ingestion == ["summary of OLD"]
+    assert client.get("/api/summary").get_json()["summary"] == "summary of NEW"
+
+
+def test_summary_in_flight_when_sources_change_is_not_cached(sources, monkeypatch):
+    started = threading.Event()
+    release = threading.Event()
+
+    def slow_summary(priority=None):
+        text = sources["text"]
+        started.set()
+        release.wait()
+        return f"summary of {text}"
+
+    monkeypatch.setattr(rag_system, "get_summary", slow_summary)
+    results = []
+    thread = threading.Thread(target=lambda: results.append(warmup.get_shared_summary()))
+    thread.start()
+    started.wait()
+
+    sources["text"] = "NEW"
+    warmup.publish_sources()
+    release.set()
+    thread.join()
+
+    assert results == ["summary of OLD"]
+    assert warmup.get_shared_summary() == "summary of NEW"
+
+
+def test_ingestion_without_new_data_keeps_cache(sources, monkeypatch):
+    assert warmup.get_shared_summary() == "summary of OLD"
+    monkeypatch.setattr(rag_system, "initialize_vector_store", lambda **kwargs: False)
+    sources["text"] = "NEW"  # Would show up if the cache were dropped
+
+    main.run_ingestion_thread([], [], main.cancel_warmup())
+
+    assert warmup.get_shared_summary() == "summary of OLD"
@@ -0,0 +1,208 @@
+import os
+import threading
+import time
+
+from rag import rag_system
+from audio_gen import generate_dialogue_script, generate_audio_files
+from limiter import request_coalescer, INTERACTIVE, BATCH
+
+# Warm-up is opt-in: it spends LLM/TTS credits on every ingestion.
+WARMUP_ENABLED = os.environ.get("WARMUP_ENABLED", "false").lower() in ("1", "true", "yes")
+
+# Starter questions are separated by "|" in the env var.
+DEFAULT_STARTER_QUESTIONS = [
+    "What are the main concepts covered in this material?",
+    "Can you explain the key terms in simple words?",
+]
+STARTER_QUESTIONS = [
+    q.strip() for q in os.environ.get("WARMUP_STARTER_QUESTIONS", "").split("|") if q.strip()
+] or DEFAULT_STARTER_QUESTIONS
+
+# Short pause between steps so interactive requests get the CPU/network first
+WARMUP_STEP_PAUSE = float(os.environ.get("WARMUP_STEP_PAUSE", "0.5"))
+
+# Precomputed results for the current knowledge base
+warm_cache = {
+    "summary": None,
+    "dialogue": None,  # List of {speaker, text, audioUrl}
+    "answers": {},     # normalized question -> (answer, docs)
+}
+
+# Reported through /api/status
+warmup_state = {
+    "status": "idle",  # idle, queued, running, complete, cancelled, error
+    "message": "",
+    "percent": 0
+}
+
+_lock = threading.Lock()
+# Bumped when an ingestion is accepted; cancels warm-ups of older ingestions
+_generation = 0
+# Bumped when new sources are swapped into rag_system; keys warm_cache and in-flight calls
+_content_version = 0
+
+
+def normalize_question(question):
+    """Key used to match incoming chat questions against starter answers."""
+    return " ".join(question.lower().split())
+
+
+def get_cached_answer(question):
+    """Returns (answer, docs) for a precomputed starter question, or None."""
+    with _lock:
+        return warm_cache["answers"].get(normalize_question(question))
+
+
+def cancel_warmup():
+    """
+    Invalidates any running warm-up. Cached results are kept: the old sources
+    stay live until the new index is in place (see publish_sources).
+    """
+    global _generation
+    with _lock:
+        _generation += 1
+        if warmup_state["status"] in ("queued", "running"):
+            warmup_state.update(status="cancelled", message="Cancelled by a newer ingestion.")
+        return _generation
+
+
+def publish_sources():
+    """Call once new sources are live in rag_system: drops results of the old ones."""
+    global _content_version
+    with _lock:
+        _content_version += 1
+        warm_cache["summary"] = None
+        warm_cache["dialogue"] = None
+        warm_cache["answers"] = {}
+
+
+def _is_current(generation):
+    with _lock:
+        return generation == _generation
+
+
+def _store(version, key, value):
+    """Stores a result only if the sources it was computed from are still live."""
+    with _lock:
+        if version != _content_version:
+            return False
+        warm_cache[key] = value
+        return True
+
+
+def _set_state(generation, **fields):
+    with _lock:
+        if generation == _generation:
+            warmup_state.update(fields)
+
+
+def _snapshot(key):
+    """Returns (content version, cached value) read together."""
+    with _lock:
+        return _content_version, warm_cache[key]
+
+
+def get_shared_summary(priority=INTERACTIVE):
+    """
+    Summary of the current sources. The warm-up and /api/summary go through the
+    same in-flight key, so a request arriving mid warm-up waits for it instead
+    of starting a second LLM call; an interactive caller joining the warm-up's
+    call raises it to interactive priority. The result is cached for later requests.
+    """
+    version, cached = _snapshot("summary")
+    if cached:
+        return cached
+
+    def compute():
+        # Priority comes from the coalesced call (most urgent caller)
+        summary = rag_system.get_summary()
+        _store(version, "summary", summary)
+        return summary
+
+    return request_coalescer.do(("summary", version), compute, priority=priority)
+
+
+def get_shared_dialogue(priority=INTERACTIVE, should_cancel=None):
+    """Dialogue script and audio of the current sources, shared like get_shared_summary."""
+    version, cached = _snapshot("dialogue")
+    if cached:
+        return cached
+
+    def compute():
+        script = generate_dialogue_script()
+        dialogue = generate_audio_files(script, should_cancel=should_cancel)
+        _store(version, "dialogue", dialogue)
+        return dialogue
+
+    return request_coalescer.do(("dialogue", version), compute, priority=priority)
+
+
+def _lower_thread_priority():
+    """Best effort: raise the niceness of the calling thread (Linux applies it per thread)."""
+    try:
+        os.setpriority(os.PRIO_PROCESS, threading.get_native_id(), 10)
+    except (AttributeError, OSError):
+        pass
+
+
+def run_warmup(generation):
+    """Precomputes summary, dialogue (script + audio) and starter answers."""
+    _lower_thread_priority()
+    cancelled = lambda: not _is_current(generation)
+    total_steps = 2 + len(STARTER_QUESTIONS)
+    done = 0
+
+    def step(msg):
+        print(f"[Warm-up] {msg}")
+        _set_state(generation, status="running", message=msg,
+                   percent=int(done * 100 / total_steps))
+
+    try:
+        if cancelled():
+            return
+        step("Precomputing summary...")
+        get_shared_summary(BATCH)
+        done += 1
+
+        if cancelled():
+            return
+        time.sleep(WARMUP_STEP_PAUSE)
+        step("Generating dialogue script and audio...")
+        get_shared_dialogue(BATCH, should_cancel=cancelled)
+        done += 1
+
+        version, answers = _snapshot("answers")
+        answers = dict(answers)
+        for question in STARTER_QUESTIONS:
+            if cancelled():
+                return
+            time.sleep(WARMUP_STEP_PAUSE)
+            step(f"Answering starter question: {question}")
+            chunks = []
+            docs = []
+            for text_chunk, chunk_docs in rag_system.stream_answer_with_docs(question, BATCH):
+                if text_chunk:
+                    chunks.append(text_chunk)
+                if chunk_docs:
+                    docs = chunk_docs
+            answers[normalize_question(question)] = ("".join(chunks), docs)
+            done += 1
+            _store(version, "answers", dict(answers))
+
+        _set_state(generation, status="complete", message="Warm-up complete.", percent=100)
+    except Exception as e:
+        print(f"Warm-up failed: {e}")
+        _set_state(generation, status="error", message=f"Error: {str(e)}")
+
+
+def start_warmup(generation):
+    """Runs the warm-up for the given ingestion generation in a background thread."""
+    if not WARMUP_ENABLED:
+        return
+    # An older ingestion thread finishing after a newer one started must not warm up
+    if not _is_current(generation):
+        return
+    _set_state(generation, status="queued", message="Queued for warm-up...", percent=0)
+    thread = threading.Thread(target=run_warmup, args=(generation,))
+    thread.daemon = True
+    thread.start()